@@ -1,18 +1,24 @@
 import asyncio
+import atexit
+import contextlib
+import gzip
 import logging
 from datetime import datetime, timezone
-from typing import Any, List, Union
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import List, Optional, Union
 
-import ujson
+import orjson
 from buttplug import ButtplugError, Client, Device, ProtocolSpec, WebsocketConnector
+from buttplug import UnexpectedMessageError
 from buttplug.client import Actuator, Sensor
-from pydantic import AnyUrl, BaseModel, Field, RootModel, field_serializer
-from pydantic import ValidationError as PydanticValidationError
+from buttplug.messages import v3
+from pydantic import BaseModel, ConfigDict, Field, RootModel
 from sanic import NotFound, Sanic, SanicException, ServerError
 from sanic.log import logger
 from sanic.response import json as sanic_json
-from sanic_ext import openapi, validate
-from sanic_ext.exceptions import ValidationError as SanicExtValidationError
+from sanic.response import raw
+from sanic_ext import openapi
 
 Number = Union[int, float]
 
@@ -38,19 +44,19 @@ class SensorNotFound(NotFound):
 @openapi.component
 class ActuatorCommand(BaseModel):
     intensity: float = Field(
-        ge=0.0, le=1.0, examples=list("1.0"), description="Intensity (0.0-1.0)"
+        ge=0.0, le=1.0, examples=[1.0], description="Intensity (0.0-1.0)"
     )
 
 
 @openapi.component
 class LinearActuatorCommand(BaseModel):
     duration: int = Field(
-        ge=0.0, examples=list("5000"), description="Time duration in milliseconds"
+        ge=0.0, examples=[5000], description="Time duration in milliseconds"
     )
     position: float = Field(
         ge=0.0,
         le=1.0,
-        examples=list("1.0"),
+        examples=[1.0],
         description="Position in linear axis (0.0 - 1.0)",
     )
 
@@ -58,36 +64,33 @@ class LinearActuatorCommand(BaseModel):
 @openapi.component
 class RotatoryActuatorCommand(BaseModel):
     speed: float = Field(
-        ge=0.0, le=1.0, examples=list("1.0"), description="Rotation speed (0.0 - 1.0)"
+        ge=0.0, le=1.0, examples=[1.0], description="Rotation speed (0.0 - 1.0)"
     )
     clockwise: bool = Field(
         default=False,
-        examples=list("true"),
+        examples=[True],
         description="True if rotating clockwise, otherwise false.",
     )
 
 
 class BaseItem(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str = Field(alias="@id")
     type: str = Field(..., alias="@type")
 
-    class Config:
-        populate_by_name = True
-        ser_json_by_alias = True
-        json_encoders = {AnyUrl: str}
-
 
 @openapi.component
 class DeviceItem(BaseItem):
-    type: str = Field("Device", alias="@type", examples=list("Device"))
-    name: str = Field(examples=list("My Device"))
-    sensors: List[str] = Field(default=[], examples=list("[/devices/0/sensors/0]"))
-    actuators: List[str] = Field(default=[], examples=list("[/devices/0/actuators/0]"))
+    type: str = Field("Device", alias="@type", examples=["Device"])
+    name: str = Field(examples=["My Device"])
+    sensors: List[str] = Field(default=[], examples=[["/devices/0/sensors/0"]])
+    actuators: List[str] = Field(default=[], examples=[["/devices/0/actuators/0"]])
     linear_actuators: List[str] = Field(
-        default=[], examples=list("[/devices/0/linear_actuators/0]")
+        default=[], examples=[["/devices/0/linear_actuators/0"]]
     )
     rotatory_actuators: List[str] = Field(
-        default=[], examples=list("[/devices/0/rotatory_actuators/0]")
+        default=[], examples=[["/devices/0/rotatory_actuators/0"]]
     )
 
 
@@ -97,9 +100,9 @@ class DeviceItemList(RootModel):
 
 @openapi.component
 class SensorItem(BaseItem):
-    type: str = Field("Sensor", alias="@type", examples=list("Sensor"))
-    description: str = Field(examples=list("Sensor Description"))
-    sensor_reading: str = Field(examples=list("/devices/0/sensors/0/read"))
+    type: str = Field("Sensor", alias="@type", examples=["Sensor"])
+    description: str = Field(examples=["Sensor Description"])
+    sensor_reading: str = Field(examples=["/devices/0/sensors/0/read"])
 
 
 class SensorItemList(RootModel):
@@ -108,24 +111,20 @@ class SensorItemList(RootModel):
 
 @openapi.component
 class SensorReadingItem(BaseItem):
-    type: str = Field("SensorReading", alias="@type", examples=list("Sensor"))
+    type: str = Field("SensorReading", alias="@type", examples=["SensorReading"])
     instant: datetime = Field(
-        examples=list("Sensor"), description="Reading instant at UTC"
+        examples=["2024-01-01T12:00:00Z"], description="Reading instant at UTC"
     )
     value: List[Number] = Field(
         alias="@value", description="Sensor readings (ints or floats)"
     )
 
-    @field_serializer("instant")
-    def serialize_dt(self, dt: datetime, _info):
-        return dt.isoformat()
-
 
 @openapi.component
 class ActuatorItem(BaseItem):
-    type: str = Field("Actuator", alias="@type", examples=list("Actuator"))
-    description: str = Field(examples=list("Actuator Description"))
-    step_count: int = Field(examples=list("69"))
+    type: str = Field("Actuator", alias="@type", examples=["Actuator"])
+    description: str = Field(examples=["Actuator Description"])
+    step_count: int = Field(examples=[69])
 
 
 class ActuatorItemList(RootModel):
@@ -134,7 +133,7 @@ class ActuatorItemList(RootModel):
 
 @openapi.component
 class LinearActuatorItem(ActuatorItem):
-    type: str = Field("LinearActuator", alias="@type", examples=list("LinearActuator"))
+    type: str = Field("LinearActuator", alias="@type", examples=["LinearActuator"])
 
 
 class LinearActuatorItemList(RootModel):
@@ -143,24 +142,50 @@ class LinearActuatorItemList(RootModel):
 
 @openapi.component
 class RotatoryActuatorItem(ActuatorItem):
-    type: str = Field(
-        "RotatoryActuator", alias="@type", examples=list("RotatoryActuator")
-    )
+    type: str = Field("RotatoryActuator", alias="@type", examples=["RotatoryActuator"])
 
 
 class RotatoryActuatorItemList(RootModel):
     root: list[RotatoryActuatorItem]
 
 
+# the models only describe responses in the openapi spec, handlers serve
+# prerendered bytes and never build them (the *ItemList wrappers included)
+SCHEMAS = {
+    model: model.model_json_schema(ref_template="#/components/schemas/{model}")
+    for model in (
+        DeviceItemList,
+        DeviceItem,
+        SensorItemList,
+        SensorItem,
+        SensorReadingItem,
+        ActuatorItemList,
+        ActuatorItem,
+        ActuatorCommand,
+        LinearActuatorItemList,
+        LinearActuatorItem,
+        LinearActuatorCommand,
+        RotatoryActuatorItemList,
+        RotatoryActuatorItem,
+        RotatoryActuatorCommand,
+    )
+}
+
+
 class ButtPlugConnectionError(SanicException):
     status_code = 502
     message = "Client Connection Failed"
 
 
-def pydantic_serializer(obj):
-    if isinstance(obj, BaseModel):
-        return obj.model_dump(by_alias=True)
-    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+class SensorReadTimeout(SanicException):
+    status_code = 504
+    message = "Sensor Read Timed Out"
+
+
+class CommandValidationError(SanicException):
+    status_code = 422
+    message = "Validation Error"
+
 
 my_log_config = {
     "version": 1,
@@ -234,53 +259,52 @@ my_log_config = {
 app = Sanic(
     "ButtRest",
     env_prefix="BUTTREST_",
-    dumps=lambda obj: ujson.dumps(obj, default=pydantic_serializer),
+    dumps=orjson.dumps,
+    loads=orjson.loads,
     log_config=my_log_config
 )
 app.config.CLIENT_NAME = "ButtRest"
+# only a default, keeps BUTTREST_GZIP_MIN_SIZE from the environment
+app.config.setdefault("GZIP_MIN_SIZE", 1024)
 app.config.FALLBACK_ERROR_FORMAT = "json"
 
-@app.exception(SanicExtValidationError)
-async def handle_validation_error(request, exception: SanicExtValidationError):
-    status = 422
-    cause = exception.extra["exception"]
-    if isinstance(cause, PydanticValidationError):
-        # Extract Pydantic error details
-        errors = cause.errors()
-        error_details = []
-        for error in errors:
-            error_details.append(
-                {
-                    "pointer": f"/{list(error['loc'])[0]}",
-                    "ctx": error.get("ctx"),
-                    "code": error["type"],
-                    "detail": error["msg"],
-                }
-            )
 
-        # RFC 9457 Problem Details format
-        problem_details = {
+def queue_file_handlers(*logger_names: str) -> None:
+    """Hands the file handlers of each logger to a background thread, so
+    writing access.log and friends never blocks the event loop."""
+    for name in logger_names:
+        log = logging.getLogger(name)
+        file_handlers = [h for h in log.handlers if isinstance(h, logging.FileHandler)]
+        if not file_handlers:
+            continue
+        queue = SimpleQueue()
+        for handler in file_handlers:
+            log.removeHandler(handler)
+        log.addHandler(QueueHandler(queue))
+        listener = QueueListener(queue, *file_handlers, respect_handler_level=True)
+        listener.start()
+        # stop() drains the queue before the handlers are closed
+        atexit.register(listener.stop)
+
+
+# dictConfig can only build queue handlers from python 3.12 on
+queue_file_handlers("sanic.root", "sanic.error", "sanic.access")
+
+
+@app.exception(CommandValidationError)
+async def handle_validation_error(request, exception: CommandValidationError):
+    status = exception.status_code
+    # RFC 9457 Problem Details format
+    return sanic_json(
+        {
             "type": "https://problems-registry.smartbear.com/validation-error",
             "title": "Validation Error",
             "status": status,
-            "detail": "Request validation failed",
-            "errors": error_details,
-        }
-        return sanic_json(
-            problem_details, status=status, content_type="application/problem+json"
-        )
-    else:
-        # Fallback for other SanicExt ValidationErrors
-        return sanic_json(
-            {
-                "type": "https://problems-registry.smartbear.com/validation-error",
-                "title": "Validation Error",
-                "status": status,
-                "detail": str(exception),
-            },
-            status=status,
-            content_type="application/problem+json",
-        )
+            "detail": str(exception),
+        },
+        status=status,
+        content_type="application/problem+json",
+    )
 
 
 @app.exception(SanicException)
@@ -293,16 +317,19 @@ async def handle_exception(request, exception: SanicException):
     )
 
 
-def jsonld(body: Any, status: int = 200):
-    return sanic_json(body=body, status=status, content_type="application/ld+json")
+def jsonld_bytes(body: bytes, status: int = 200):
+    return raw(body, status=status, content_type="application/ld+json")
+
+
+STATUS_OK = orjson.dumps({"status": "ok"})
+STATUS_ACCEPTED = orjson.dumps({"status": "accepted"})
 
 
 #######################
 # Server Lifecycle
 
 
-@app.before_server_start
-async def before_server_start(app):
+def create_client() -> tuple[Client, WebsocketConnector]:
     # export BUTTREST_CLIENT_NAME=myclientname
     client = Client(app.config.CLIENT_NAME, ProtocolSpec.v3)
     if app.debug:
@@ -314,19 +341,129 @@ async def before_server_start(app):
 
     # Make buttplug logging level match sanic logging level
     client.logger.level = logger.level
+    return client, connector
+
+
+@app.before_server_start
+async def before_server_start(app):
+    # stays None until maintain_client has connected, get_client() 502s
+    app.ctx.client = None
+    # the client maintain_client is connecting or connected, for shutdown
+    app.ctx.open_client = None
+    app.ctx.batchers = {}
+    app.ctx.scan_task = None
+    url_cache.clear()
+    refresh_prerendered({})
+    # a missing url can't be fixed by retrying, so fail the startup instead
+    if not app.config.get("INTIFACE_URL"):
+        raise SanicException("BUTTREST_INTIFACE_URL is not set")
+    # connecting and scanning take seconds, so don't hold up the server
+    app.ctx.client_task = app.add_task(maintain_client())
 
+
+@app.after_server_stop
+async def after_server_stop(app):
+    task = app.ctx.client_task
+    if task is not None:
+        task.cancel()
+        # waits without re-raising, the task logs its own failures
+        await asyncio.wait([task])
+    if app.ctx.open_client is not None:
+        await close_client(app.ctx.open_client)
+
+
+async def connect_client(client: Client, connector: WebsocketConnector) -> None:
     await client.connect(connector)
     await client.start_scanning()
-    await asyncio.sleep(3)
+    await wait_for_devices(client)
     await client.stop_scanning()
-
     logger.info(f"Registered devices: {client.devices}")
-    app.ctx.client = client
 
 
-@app.after_server_stop
-async def after_server_stop(app):
-    await app.ctx.client.disconnect()
+async def close_client(client: Client) -> None:
+    """Disconnects a client that may only be halfway connected."""
+    if client.connected:
+        # raises again if the ping loop already died on a broken socket
+        with contextlib.suppress(Exception):
+            await client.disconnect()
+
+
+async def maintain_client(backoff: float = 1.0, max_backoff: float = 30.0) -> None:
+    """Connects to Intiface and reconnects whenever the connection drops,
+    waiting `backoff` seconds between attempts and doubling the wait after
+    each failed one, up to `max_backoff` seconds."""
+    delay = backoff
+    while True:
+        client = None
+        try:
+            # buttplug keeps the devices and scan state of a dead session, so
+            # every attempt starts from a new client
+            client, connector = create_client()
+            app.ctx.open_client = client
+            await connect_client(client, connector)
+            delay = backoff
+            app.ctx.client = client
+            refresh_prerendered(client.devices)
+            # connected is only cleared when the socket closes with an error,
+            # so wait on the socket itself
+            await connector._connection.wait_closed()
+            logger.warning("Lost connection to Intiface, reconnecting")
+        except ButtplugError as error:
+            logger.warning(f"Intiface connection failed: {error}")
+        except Exception:
+            # e.g. intiface answering the handshake with an Error message
+            logger.exception("Intiface connection failed")
+        app.ctx.client = None
+        if client is not None:
+            await close_client(client)
+        app.ctx.open_client = None
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_backoff)
+
+
+async def wait_for_devices(
+    client: Client, timeout: float = 3.0, settle: float = 0.5, poll: float = 0.1
+) -> None:
+    """Waits until at least one device is registered and no new ones have
+    shown up for `settle` seconds, or until `timeout` seconds have passed."""
+    loop = asyncio.get_running_loop()
+    started = changed = loop.time()
+    count = len(client.devices)
+    while (now := loop.time()) - started < timeout:
+        if len(client.devices) != count:
+            count, changed = len(client.devices), now
+        elif count and now - changed >= settle:
+            break
+        await asyncio.sleep(poll)
+
+
+#######################
+# Middleware
+
+
+@app.on_request
+async def check_client_connected(request):
+    # checked once here so the get_* helpers don't have to on every call
+    if request.path.startswith("/devices"):
+        get_client()
+
+
+@app.on_response
+async def gzip_response(request, response):
+    # export BUTTREST_GZIP_MIN_SIZE=4096
+    body = response.body
+    if (
+        not body
+        or len(body) < app.config.GZIP_MIN_SIZE
+        or "json" not in response.content_type
+    ):
+        return
+    # caches must keep the gzip and identity variants apart
+    response.headers["vary"] = "Accept-Encoding"
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        # level 1 gets most of the size win for a fraction of the cpu
+        response.body = gzip.compress(body, compresslevel=1, mtime=0)
+        response.headers["content-encoding"] = "gzip"
 
 
 #######################
@@ -335,163 +472,123 @@ async def after_server_stop(app):
 
 @app.get("/healthz")
 async def health_check(request):
-    return jsonld({"status": "ok"})
+    get_client()
+    return jsonld_bytes(STATUS_OK)
 
 
 @app.get("/")
 async def index(request):
-    return jsonld({"status": "ok"})
+    return jsonld_bytes(STATUS_OK)
 
 
 @app.post("/scan")
 @openapi.summary("Scan for devices")
-@openapi.description("Calls start_scanning, sleeps 3 seconds, stops scanning")
+@openapi.description(
+    "Starts a 3 second scan in the background and returns 202 immediately"
+)
 async def scan(request):
-    # this could return 202 and do it in the background
     client: Client = get_client()
-    await client.start_scanning()
-    await asyncio.sleep(3)
-    await client.stop_scanning()
-    return jsonld({"status": "ok"})
+    # concurrent calls share the scan that is already running
+    if app.ctx.scan_task is None or app.ctx.scan_task.done():
+        app.ctx.scan_task = app.add_task(background_scan(client))
+    return jsonld_bytes(STATUS_ACCEPTED, status=202)
+
+
+async def background_scan(client: Client):
+    # nobody awaits this task, so errors have to be logged here
+    try:
+        await client.start_scanning()
+        await asyncio.sleep(3)
+        await client.stop_scanning()
+    except ButtplugError as error:
+        logger.warning(f"Scan failed: {error}")
+    finally:
+        refresh_prerendered(client.devices)
 
 
 @app.get("/devices")
 @openapi.summary("Get all registered devices")
 @openapi.description("Renders devices as array of JSON objects")
-@openapi.definition(
-    response={
-        "application/ld+json": DeviceItemList.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[DeviceItemList]})
 async def devices_get(request):
-    client: Client = get_client()
-    devices = [render_device(device) for device in client.devices.values()]
-    return jsonld(DeviceItemList(root=devices))
+    return jsonld_bytes(get_prerendered(("devices",)))
 
 
 @app.get("/devices/<device_id:int>")
 @openapi.summary("Get a device")
 @openapi.description("Renders device as JSON object")
-@openapi.definition(
-    response={
-        "application/ld+json": DeviceItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[DeviceItem]})
 async def device_get(request, device_id: int):
-    device = get_device(device_id)
-    device_resource = render_device(device)
-    return jsonld(device_resource)
+    get_device(device_id)
+    return jsonld_bytes(get_prerendered(("devices", device_id)))
 
 
 @app.get("/devices/<device_id:int>/sensors")
 @openapi.summary("Get all sensors of device")
 @openapi.description("Renders sensors as array of JSON objects")
-@openapi.definition(
-    response={
-        "application/ld+json": SensorItemList.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[SensorItemList]})
 async def sensors_get(request, device_id: int):
-    device = get_device(device_id)
-    sensor_resources = [render_sensor(device_id, s) for s in device.sensors]
-    return jsonld(sensor_resources)
+    get_device(device_id)
+    return jsonld_bytes(get_prerendered(("sensors", device_id)))
 
 
 @app.get("/devices/<device_id:int>/sensors/<sensor_id:int>")
 @openapi.summary("Get sensor of device")
 @openapi.description("Renders sensor as JSON object")
-@openapi.definition(
-    response={
-        "application/ld+json": SensorItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[SensorItem]})
 async def sensor_get(request, device_id: int, sensor_id: int):
-    sensor = get_sensor(device_id, sensor_id)
-    sensor_resource = render_sensor(device_id, sensor)
-    return jsonld(sensor_resource)
+    get_sensor(device_id, sensor_id)
+    return jsonld_bytes(get_prerendered(("sensors", device_id, sensor_id)))
 
 
 @app.get("/devices/<device_id:int>/sensors/<sensor_id:int>/read")
 @openapi.summary("Get sensor reading of device")
 @openapi.description("Renders sensor reading")
-@openapi.definition(
-    response={
-        "application/ld+json": SensorReadingItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[SensorReadingItem]})
 async def sensor_reading_get(request, device_id: int, sensor_id: int):
     try:
         sensor = get_sensor(device_id, sensor_id)
         # sensor.read doesn't enforce a timeout so we do it here
-        readings = await asyncio.wait_for(sensor.read(), timeout=1.0)
+        async with asyncio.timeout(1.0):
+            readings = await sensor.read()
         sensor_reading = render_sensor_reading(device_id, sensor, readings)
-        return jsonld(sensor_reading)
+        # OPT_UTC_Z writes the instant the way pydantic does, with a Z suffix
+        body = orjson.dumps(sensor_reading, option=orjson.OPT_UTC_Z)
+        return jsonld_bytes(body)
     except TimeoutError:
-        return ServerError(status_code=504, message="Sensor read timed out")
+        raise SensorReadTimeout
 
 
 @app.get("/devices/<device_id:int>/actuators")
 @openapi.summary("Get actuators of device")
 @openapi.description("Renders actuators as array of JSON objects")
-@openapi.definition(
-    response={
-        "application/ld+json": ActuatorItemList.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[ActuatorItemList]})
 async def actuators_get(request, device_id: int):
-    device = get_device(device_id)
-    actuator_resources = [render_actuator(device_id, a) for a in device.actuators]
-    return jsonld(actuator_resources)
+    get_device(device_id)
+    return jsonld_bytes(get_prerendered(("actuators", device_id)))
 
 
 @app.get("/devices/<device_id:int>/actuators/<actuator_id:int>")
 @openapi.summary("Get actuator of device")
 @openapi.description("Renders actuator as JSON object")
-@openapi.definition(
-    response={
-        "application/ld+json": ActuatorItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[ActuatorItem]})
 async def actuator_get(request, device_id: int, actuator_id: int):
-    actuator = get_actuator(device_id, actuator_id)
-    actuator_resource = render_actuator(device_id, actuator)
-    return jsonld(actuator_resource)
+    get_actuator(device_id, actuator_id)
+    return jsonld_bytes(get_prerendered(("actuators", device_id, actuator_id)))
 
 
 @app.post("/devices/<device_id:int>/actuators/<actuator_id:int>")
 @openapi.summary("Change actuator state")
 @openapi.description("Takes json body and sends actuator a command")
-@openapi.definition(
-    body={
-        "application/json": ActuatorCommand.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
-@validate(json=ActuatorCommand)
-async def actuator_post(
-    request, device_id: int, actuator_id: int, body: ActuatorCommand
-):
+@openapi.definition(body={"application/json": SCHEMAS[ActuatorCommand]})
+async def actuator_post(request, device_id: int, actuator_id: int):
+    body = command_body(request, ActuatorCommand)
+    intensity = number_field(ActuatorCommand, body, "intensity", 0.0, 1.0)
     actuator = get_actuator(device_id, actuator_id)
-    intensity = body.intensity
     logger.debug(f"actuator_post: {intensity}")
     try:
-        await actuator.command(intensity)
-        return jsonld({"status": "ok"})
+        await get_batcher(device_id).command(actuator, intensity)
+        return jsonld_bytes(STATUS_OK)
     except ButtplugError as error:
         raise ServerError(f"{error}")
 
@@ -499,55 +596,33 @@ async def actuator_post(
 @app.get("/devices/<device_id:int>/linear_actuators")
 @openapi.summary("Get linear actuators of device")
 @openapi.description("Renders linear actuators as array of JSON objects")
-@openapi.definition(
-    response={
-        "application/json": LinearActuatorItemList.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/json": SCHEMAS[LinearActuatorItemList]})
 async def linear_actuators_get(request, device_id: int):
-    device = get_device(device_id)
-    actuator_resources = [
-        render_actuator(device_id, a) for a in device.linear_actuators
-    ]
-    return jsonld(actuator_resources)
+    get_device(device_id)
+    return jsonld_bytes(get_prerendered(("linear_actuators", device_id)))
 
 
 @app.get("/devices/<device_id:int>/linear_actuators/<actuator_id:int>")
 @openapi.summary("Get linear actuator of device")
 @openapi.description("Renders linear actuator as JSON object")
-@openapi.definition(
-    response={
-        "application/json": LinearActuatorItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/json": SCHEMAS[LinearActuatorItem]})
 async def linear_actuator_get(request, device_id: int, actuator_id: int):
-    actuator = get_linear_actuator(device_id, actuator_id)
-    actuator_resource = render_actuator(device_id, actuator)
-    return jsonld(actuator_resource)
+    get_linear_actuator(device_id, actuator_id)
+    return jsonld_bytes(get_prerendered(("linear_actuators", device_id, actuator_id)))
 
 
 @app.post("/devices/<device_id:int>/linear_actuators/<actuator_id:int>")
 @openapi.summary("Change linear actuator state")
 @openapi.description("Takes json body and sends linear actuator a command")
-@openapi.definition(
-    body={
-        "application/json": LinearActuatorCommand.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
-@validate(json=LinearActuatorCommand)
-async def linear_actuator_post(
-    request, device_id: int, actuator_id: int, body: LinearActuatorCommand
-):
+@openapi.definition(body={"application/json": SCHEMAS[LinearActuatorCommand]})
+async def linear_actuator_post(request, device_id: int, actuator_id: int):
+    body = command_body(request, LinearActuatorCommand)
+    duration = integer_field(LinearActuatorCommand, body, "duration", 0)
+    position = number_field(LinearActuatorCommand, body, "position", 0.0, 1.0)
     actuator = get_linear_actuator(device_id, actuator_id)
     try:
-        await actuator.command(body.duration, body.position)
-        return jsonld({"status": "ok"})
+        await actuator.command(duration, position)
+        return jsonld_bytes(STATUS_OK)
     except ButtplugError as error:
         raise ServerError(f"{error}")
 
@@ -555,55 +630,35 @@ async def linear_actuator_post(
 @app.get("/devices/<device_id:int>/rotatory_actuators")
 @openapi.summary("Get rotatory actuators of device")
 @openapi.description("Renders rotatory actuators as array of JSON objects")
-@openapi.definition(
-    response={
-        "application/ld+json": RotatoryActuatorItemList.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[RotatoryActuatorItemList]})
 async def rotatory_actuators_get(request, device_id: int):
-    device = get_device(device_id)
-    actuator_resources = [
-        render_actuator(device_id, a) for a in device.linear_actuators
-    ]
-    return jsonld(actuator_resources)
+    get_device(device_id)
+    return jsonld_bytes(get_prerendered(("rotatory_actuators", device_id)))
 
 
 @app.get("/devices/<device_id:int>/rotatory_actuators/<actuator_id:int>")
 @openapi.summary("Get rotatory actuator of device")
 @openapi.description("Renders rotatory actuator as JSON object")
-@openapi.definition(
-    response={
-        "application/ld+json": RotatoryActuatorItem.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
+@openapi.definition(response={"application/ld+json": SCHEMAS[RotatoryActuatorItem]})
 async def rotatory_actuator_get(request, device_id: int, actuator_id: int):
-    actuator = get_rotatory_actuator(device_id, actuator_id)
-    actuator_resource = render_actuator(device_id, actuator)
-    return jsonld(actuator_resource)
+    get_rotatory_actuator(device_id, actuator_id)
+    return jsonld_bytes(get_prerendered(("rotatory_actuators", device_id, actuator_id)))
 
 
 @app.post("/devices/<device_id:int>/rotatory_actuators/<actuator_id:int>")
 @openapi.summary("Changes rotatory actuator state")
 @openapi.description("Takes json body and sends rotatory actuator a command")
-@openapi.definition(
-    body={
-        "application/json": RotatoryActuatorCommand.model_json_schema(
-            ref_template="#/components/schemas/{model}"
-        )
-    }
-)
-@validate(json=RotatoryActuatorCommand)
-async def rotatory_actuator_post(
-    request, device_id: int, actuator_id: int, body: RotatoryActuatorCommand
-):
+@openapi.definition(body={"application/json": SCHEMAS[RotatoryActuatorCommand]})
+async def rotatory_actuator_post(request, device_id: int, actuator_id: int):
+    body = command_body(request, RotatoryActuatorCommand)
+    speed = number_field(RotatoryActuatorCommand, body, "speed", 0.0, 1.0)
+    clockwise = body.get("clockwise", False)
+    if not isinstance(clockwise, bool):
+        raise command_error(RotatoryActuatorCommand, "clockwise should be a boolean")
     actuator = get_rotatory_actuator(device_id, actuator_id)
     try:
-        await actuator.command(body.speed, body.clockwise)
-        return jsonld({"status": "ok"})
+        await actuator.command(speed, clockwise)
+        return jsonld_bytes(STATUS_OK)
     except ButtplugError as error:
         raise ServerError(f"{error}")
 
@@ -612,67 +667,173 @@ async def rotatory_actuator_post(
 # Rendering
 
 
-def render_device(device: Device):
-    device_id = app.url_for("device_get", device_id=device.index)
-    logger.debug(f"device_id = {device_id}")
-    device_item = DeviceItem(
-        id=app.url_for("device_get", device_id=device.index),
-        name=device.name,
-        sensors=[
-            app.url_for("sensor_get", device_id=device.index, sensor_id=s.index)
+def render_device(device: Device) -> dict:
+    device_id = cached_url_for("device_get", device_id=device.index)
+    logger.debug("device_id = %s", device_id)
+    # resources are only ever serialized, so build the DeviceItem dict directly
+    return {
+        "@id": device_id,
+        "@type": "Device",
+        "name": device.name,
+        "sensors": [
+            cached_url_for("sensor_get", device_id=device.index, sensor_id=s.index)
             for s in device.sensors
         ],
-        actuators=[
-            app.url_for("actuator_get", device_id=device.index, actuator_id=la.index)
+        "actuators": [
+            cached_url_for("actuator_get", device_id=device.index, actuator_id=la.index)
             for la in device.actuators
         ],
-        linear_actuators=[
-            app.url_for(
+        "linear_actuators": [
+            cached_url_for(
                 "linear_actuator_get", device_id=device.index, actuator_id=la.index
             )
             for la in device.linear_actuators
         ],
-        rotatory_actuators=[
-            app.url_for(
+        "rotatory_actuators": [
+            cached_url_for(
                 "rotatory_actuator_get", device_id=device.index, actuator_id=ra.index
             )
             for ra in device.rotatory_actuators
         ],
-    )
-    return device_item
+    }
 
 
-def render_sensor(device_id, sensor: Sensor):
-    sensor_id = app.url_for("sensor_get", device_id=device_id, sensor_id=sensor.index)
-    sensor_item = SensorItem(
-        id=sensor_id,
-        description=sensor.description,
-        sensor_reading=app.url_for(
+def render_sensor(device_id, sensor: Sensor) -> dict:
+    sensor_id = cached_url_for(
+        "sensor_get", device_id=device_id, sensor_id=sensor.index
+    )
+    return {
+        "@id": sensor_id,
+        "@type": "Sensor",
+        "description": sensor.description,
+        "sensor_reading": cached_url_for(
             "sensor_reading_get", device_id=device_id, sensor_id=sensor.index
         ),
-    )
-    return sensor_item
+    }
 
 
-def render_sensor_reading(device_id, sensor: Sensor, readings: List[Number]):
-    resource = SensorReadingItem(
-        id=app.url_for(
+def render_sensor_reading(device_id, sensor: Sensor, readings: List[Number]) -> dict:
+    return {
+        "@id": cached_url_for(
             "sensor_reading_get", device_id=device_id, sensor_id=sensor.index
         ),
-        instant=datetime.now(timezone.utc),
-        value=readings,
-    )
-    return resource
+        "@type": "SensorReading",
+        "instant": datetime.now(timezone.utc),
+        "@value": readings,
+    }
 
 
-def render_actuator(device_id, actuator: Actuator):
-    actuator_id = app.url_for(
-        "actuator_get", device_id=device_id, actuator_id=actuator.index
-    )
-    actuator_item = ActuatorItem(
-        id=actuator_id, description=actuator.description, step_count=actuator.step_count
+def render_actuator(
+    device_id,
+    actuator: Actuator,
+    endpoint: str = "actuator_get",
+    item_type: str = "Actuator",
+) -> dict:
+    actuator_id = cached_url_for(
+        endpoint, device_id=device_id, actuator_id=actuator.index
     )
-    return actuator_item
+    return {
+        "@id": actuator_id,
+        "@type": item_type,
+        "description": actuator.description,
+        "step_count": actuator.step_count,
+    }
+
+
+def prerender(devices: dict[int, Device]) -> dict[tuple, bytes]:
+    """Serializes every device, sensor and actuator resource once.
+
+    Keys are (collection, device_id) for the listing endpoints and
+    (collection, device_id, index) for the individual resources.
+    """
+    # each resource dict is shared by the listing and the individual resource
+    prerendered = {}
+    device_resources = []
+    for device in devices.values():
+        device_id = device.index
+        device_resource = render_device(device)
+        device_resources.append(device_resource)
+        prerendered[("devices", device_id)] = orjson.dumps(device_resource)
+        parts = {
+            "sensors": [render_sensor(device_id, s) for s in device.sensors],
+            "actuators": [render_actuator(device_id, a) for a in device.actuators],
+            "linear_actuators": [
+                render_actuator(device_id, a, "linear_actuator_get", "LinearActuator")
+                for a in device.linear_actuators
+            ],
+            "rotatory_actuators": [
+                render_actuator(
+                    device_id, a, "rotatory_actuator_get", "RotatoryActuator"
+                )
+                for a in device.rotatory_actuators
+            ],
+        }
+        for collection, resources in parts.items():
+            prerendered[(collection, device_id)] = orjson.dumps(resources)
+            for index, resource in enumerate(resources):
+                prerendered[(collection, device_id, index)] = orjson.dumps(resource)
+    prerendered[("devices",)] = orjson.dumps(device_resources)
+    return prerendered
+
+
+#######################
+# Command batching
+
+
+class ScalarCommandBatcher:
+    """Coalesces scalar commands for one device into a single ScalarCmd.
+
+    Commands that arrive within max_wait seconds of the first one are sent
+    together, up to max_batch_size actuators. A second command for the same
+    actuator in an open batch replaces the first.
+    """
+
+    def __init__(
+        self, device: Device, max_batch_size: int = 8, max_wait: float = 0.005
+    ) -> None:
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.scalars: dict[int, v3.Scalar] = {}
+        self.sent: Optional[asyncio.Future] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: set[asyncio.Task] = set()
+
+    async def command(self, actuator: Actuator, scalar: float) -> None:
+        if self.sent is None:
+            loop = asyncio.get_running_loop()
+            self.sent = loop.create_future()
+            self.timer = loop.call_later(self.max_wait, self.flush)
+        self.scalars[actuator.index] = v3.Scalar(actuator.index, scalar, actuator.type)
+        sent = self.sent
+        if len(self.scalars) >= self.max_batch_size:
+            self.flush()
+        # shielded so a disconnecting client doesn't cancel the batch for others
+        await asyncio.shield(sent)
+
+    def flush(self) -> None:
+        self.timer.cancel()
+        scalars, sent = list(self.scalars.values()), self.sent
+        self.scalars, self.sent, self.timer = {}, None, None
+        task = asyncio.create_task(self.send(scalars, sent))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send(self, scalars: List[v3.Scalar], sent: asyncio.Future) -> None:
+        logger.debug(f"send: device={self.device.index} scalars={scalars}")
+        try:
+            message = await self.device.send(v3.ScalarCmd(self.device.index, scalars))
+            if isinstance(message, v3.Error):
+                raise message.error_code.exception(message.error_message)
+            if not isinstance(message, v3.Ok):
+                raise UnexpectedMessageError(
+                    f"while sending scalar commands {scalars} "
+                    f"(device: {self.device.index}):\n{message}"
+                )
+        except Exception as error:
+            sent.set_exception(error)
+        else:
+            sent.set_result(None)
 
 
 #######################
@@ -686,9 +847,9 @@ async def test_command(device: int, actuator: int, intensity: int, duration: int
         f"test_command: device={device} device={actuator} device={intensity} duration={duration}"
     )
 
-    # exec does not call before_server_start
-    await before_server_start(app)
-    client: Client = app.ctx.client
+    # exec does not run the server listeners
+    client, connector = create_client()
+    await connect_client(client, connector)
     if not client.connected:
         raise ConnectionError
 
@@ -708,54 +869,148 @@ async def test_command(device: int, actuator: int, intensity: int, duration: int
 
     await asyncio.sleep(selected_duration)
 
-    # exec does not call after_server_stop
-    await after_server_stop(app)
+    await client.disconnect()
 
 
 #######################
 # Utility methods
 
+# (endpoint, *(name, id)) -> url, urls only depend on the route and the ids
+url_cache: dict[tuple, str] = {}
+
+
+def cached_url_for(endpoint: str, **kwargs) -> str:
+    # sorted, so the key doesn't depend on the keyword order
+    key = (endpoint, *sorted(kwargs.items()))
+    try:
+        return url_cache[key]
+    except KeyError:
+        url = url_cache[key] = app.url_for(endpoint, **kwargs)
+        return url
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q=0."""
+    qualities = {}
+    for token in accept_encoding.split(","):
+        coding, *params = token.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    # an explicit gzip entry wins over the * wildcard
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def get_batcher(device_id) -> ScalarCommandBatcher:
+    device = get_device(device_id)
+    batcher = app.ctx.batchers.get(device_id)
+    # a re-added device gets a new Device object under the same index
+    if batcher is None or batcher.device is not device:
+        batcher = app.ctx.batchers[device_id] = ScalarCommandBatcher(device)
+    return batcher
+
+
+def refresh_prerendered(devices: dict[int, Device]) -> None:
+    app.ctx.prerendered = prerender(devices)
+    app.ctx.prerendered_devices = devices
+
+
+def get_prerendered(key: tuple) -> bytes:
+    # devices can come and go between scans, so re-render if the set changed
+    devices = app.ctx.client.devices
+    if devices != app.ctx.prerendered_devices:
+        refresh_prerendered(devices)
+    return app.ctx.prerendered[key]
+
+
+# the command models only describe the request bodies in the openapi spec,
+# parsing them by hand skips a full pydantic validation on every write, and
+# the strict json type checks live here rather than in the models
+
+
+def command_error(model: type[BaseModel], detail: str) -> CommandValidationError:
+    return CommandValidationError(
+        f"Invalid request body: {model.__name__}. Error: {detail}"
+    )
+
+
+def command_body(request, model: type[BaseModel]) -> dict:
+    body = request.json
+    if not isinstance(body, dict):
+        raise command_error(model, "body should be a JSON object")
+    return body
+
+
+def number_field(
+    model: type[BaseModel], body: dict, name: str, ge: float, le: float
+) -> Number:
+    value = body.get(name)
+    # bool is an int subclass, but not a number in json
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, (int, float))
+        or not ge <= value <= le
+    ):
+        raise command_error(model, f"{name} should be a number from {ge} to {le}")
+    return value
+
+
+def integer_field(model: type[BaseModel], body: dict, name: str, ge: int) -> int:
+    value = body.get(name)
+    if isinstance(value, bool) or not isinstance(value, int) or value < ge:
+        raise command_error(model, f"{name} should be an integer of at least {ge}")
+    return value
+
 
 def get_client() -> Client:
     client = app.ctx.client
-    if not client.connected:
+    if client is None or not client.connected:
         raise ButtPlugConnectionError
     return client
 
 
 def get_device(device_id) -> Device:
-    client: Client = get_client()
-    if len(client.devices) <= device_id:
+    client: Client = app.ctx.client
+    # device indexes are assigned by intiface and need not be contiguous
+    try:
+        return client.devices[device_id]
+    except KeyError:
         raise DeviceNotFound(device_id)
-    return client.devices[device_id]
 
 
 def get_sensor(device_id, sensor_id) -> Sensor:
-    device = get_device(device_id)
-    if len(device.sensors) <= sensor_id:
+    # buttplug builds a new tuple on every access, so fetch it once
+    sensors = get_device(device_id).sensors
+    if not 0 <= sensor_id < len(sensors):
         raise SensorNotFound(sensor_id)
-    return device.sensors[sensor_id]
+    return sensors[sensor_id]
 
 
 def get_actuator(device_id, actuator_id) -> Actuator:
-    device = get_device(device_id)
-    if len(device.actuators) <= actuator_id:
+    actuators = get_device(device_id).actuators
+    if not 0 <= actuator_id < len(actuators):
         raise ActuatorNotFound(actuator_id)
-    return device.actuators[actuator_id]
+    return actuators[actuator_id]
 
 
 def get_linear_actuator(device_id, actuator_id) -> Actuator:
-    device = get_device(device_id)
-    if len(device.linear_actuators) <= actuator_id:
+    linear_actuators = get_device(device_id).linear_actuators
+    if not 0 <= actuator_id < len(linear_actuators):
         raise ActuatorNotFound(actuator_id)
-    return device.linear_actuators[actuator_id]
+    return linear_actuators[actuator_id]
 
 
 def get_rotatory_actuator(device_id, actuator_id) -> Actuator:
-    device = get_device(device_id)
-    if len(device.rotatory_actuators) <= actuator_id:
+    rotatory_actuators = get_device(device_id).rotatory_actuators
+    if not 0 <= actuator_id < len(rotatory_actuators):
         raise ActuatorNotFound(actuator_id)
-    return device.rotatory_actuators[actuator_id]
+    return rotatory_actuators[actuator_id]
 
 
 if __name__ == "__main__":